@@ -1,48 +1,193 @@
 import tkinter as tk
 from tkinter import scrolledtext
 import threading
+import os 
+# Cap the OpenMP/BLAS pools before numpy loads them. Inference gets half the cores,
+# the rest are left for the recording callback, VAD and GUI threads: with every
+# library defaulting to one thread per core they oversubscribe the CPU during inference.
+# A thread count already set in the environment wins, for CTranslate2's pool as well.
+os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // 2)))
+os.environ.setdefault("MKL_NUM_THREADS", os.environ["OMP_NUM_THREADS"])
+# OpenMP also accepts a per-nesting-level list ("4,2"); the outer level is the one that counts here
+INFERENCE_THREADS = max(1, int(os.environ["OMP_NUM_THREADS"].split(",")[0]))
 import sounddevice as sd
 import numpy as np
-import whisper
-import queue
+import bisect
 import time
 import sys
-import os 
-from scipy.signal import resample 
+import queue
+from overlap import normalize_words, strip_overlap
+# faster_whisper/ctranslate2, soxr and webrtcvad are imported in load_model_async(),
+# so the window shows up before the heavy native libraries are loaded
 
 # --- Configuration ---
 MODEL_NAME = "tiny.en" 
-SAMPLERATE = 48000       
+# Inference device: "auto" tries CUDA (FP16) when a GPU is visible and falls back to the CPU (INT8)
+# if it fails to load or run; "cuda" or "cpu" forces one
+INFERENCE_DEVICE = os.environ.get("CAPTION_X_DEVICE", "auto").lower()
+SAMPLERATE = 48000       # Fallback capture format if the device rejects 16 kHz mono
 CHANNELS = 2             
 WHISPER_TARGET_SR = 16000
-CHUNK_DURATION = 5 
-VOLUME_THRESHOLD = 10    # *** CHANGED: Lowered threshold for transcription ***
+CHUNK_DURATION = 5       # Length of each transcribed window, in seconds
+STRIDE_DURATION = 2      # A new window is emitted this often, overlapping the previous one
+VOLUME_THRESHOLD = 10    # RMS below which a chunk counts as silence and skips the VAD; kept low for low-gain mics
+VAD_AGGRESSIVENESS = 2   # webrtcvad mode, 0 (least) to 3 (most aggressive about filtering out non-speech)
+VAD_FRAME_MS = 30        # webrtcvad accepts 10, 20 or 30 ms frames
+VAD_MIN_SPEECH_MS = 240  # Consecutive speech frames needed to count as speech; noise only trips isolated frames
 WHISPER_QUEUE_TIMEOUT = 5 
+STREAM_BLOCKSIZE = 1024  # Frames delivered per input-stream callback
+UI_POLL_MS = 50          # How often the GUI thread drains UI_Q
+MAX_QUEUE_DEPTH = 2      # Chunks allowed to wait for transcription; older ones are dropped beyond this
+# Queued chunks transcribed together in one batched call when transcription falls behind:
+# the whole queue, since no more than MAX_QUEUE_DEPTH chunks can ever be waiting
+MAX_BATCH_SIZE = MAX_QUEUE_DEPTH
+# Window slots: enough for a full queue, a full batch being transcribed and one being checked by the VAD
+RING_CHUNKS = 2 * MAX_QUEUE_DEPTH + 1
+# Recorded audio kept in the tape: a full window plus one stride per queued window, with
+# two strides of slack so a window being preprocessed is never overwritten in practice
+TAPE_DURATION = CHUNK_DURATION + (MAX_QUEUE_DEPTH + 2) * STRIDE_DURATION
+# Stereo -> mono: "ch0" takes the first channel, "mean" averages both, "auto" decides on the
+# first voiced chunk: the louder channel if the other is (nearly) silent, e.g. a mono mic on a
+# stereo input, "ch0" if the channels are (nearly) identical, otherwise "mean"
+MONO_MODE = os.environ.get("CAPTION_X_MONO", "auto").lower()
+MONO_CORRELATION_THRESHOLD = 0.99
+MONO_SILENT_CHANNEL_RATIO = 0.1  # A channel with less than this fraction of the other's energy (-10 dB) is ignored
+RESAMPLE_QUALITY = "MQ"  # libsoxr medium quality: proper anti-aliasing at near-QQ speed
+
+# Decoding options, fixed for the whole session and shared by every transcribe call.
+# Captions only need text, so timestamp tokens are not sampled.
+TRANSCRIBE_OPTIONS = dict(
+    language="en", 
+    beam_size=1, 
+    vad_filter=False, 
+    without_timestamps=True
+)
 
 # Prioritizing Index 1 as it was the last one confirmed to be open and receiving *some* signal
 DEVICE_INDICES_TO_TRY = [1, 5, 9, 13, 0, 4, 14, 18, 19, 20] 
+# Capture formats tried on each device, best first: native 16 kHz mono needs no resampling
+STREAM_FORMATS_TO_TRY = [(WHISPER_TARGET_SR, 1), (SAMPLERATE, CHANNELS)]
+# Probing only validates settings; set True to also open/start each candidate stream
+# (slower startup, but catches devices that are locked by another application)
+VERIFY_DEVICE_OPEN = False
 
 # --- Whisper Model and Global Flags ---
-try:
-    if not os.path.exists(os.path.expanduser(f"~/.cache/whisper/{MODEL_NAME}.pt")):
-        print(f"Downloading model {MODEL_NAME}. This might take a moment...")
-    
-    model = whisper.load_model(MODEL_NAME)
-    print("Model loaded successfully.")
-except Exception as e:
-    print(f"Fatal Error loading Whisper model: {e}", file=sys.stderr)
-    sys.exit(1)
-
+# Loaded in the background by load_model_async()
+model = None
+batched_model = None
+DEVICE = None
+COMPUTE_TYPE = None
+soxr = None
+vad = None
+
+model_ready = threading.Event()  # Set once the model is loaded and the warm-up inference has finished
 is_recording = False
 is_paused = False
-audio_queue = queue.Queue()
+# Window handoff between the recording callback, the recording thread and the transcriber.
+# The callback writes the audio once into TAPE, a preallocated mirrored ring: every frame
+# is stored at position p and p + tape_frames, so any window is one contiguous slice.
+# Only slot indices change hands; each window is a zero-copy view into the tape
+# described by the per-index lists below, guarded by one condition (see allocate_chunk_buffers).
+# A slot goes FREE -> CAPTURED (callback) -> READY (speech check in the recording thread)
+# -> BUSY (transcriber) -> FREE; silent or dropped windows go straight back to FREE.
+BUF_FREE, BUF_CAPTURED, BUF_READY, BUF_BUSY = range(4)
+TAPE = np.empty((0, CHANNELS), dtype=np.int16)
+tape_frames = 0
+buf_start_time = [0.0] * RING_CHUNKS
+buf_pos = [0] * RING_CHUNKS      # Absolute index of the window's first frame since the session started
+buf_frames = [0] * RING_CHUNKS   # Frames in the window (windows are shorter right after start/resume)
+buf_seq = [0] * RING_CHUNKS      # Window sequence number; consecutive numbers overlap in time
+buf_state = [BUF_FREE] * RING_CHUNKS
+handoff = threading.Condition()  # Notified whenever a slot becomes BUF_CAPTURED or BUF_READY
+# Drops and stream status seen in the callback, as (kind, value) pairs; guarded by `handoff`
+# and printed by the recording thread (see report_callback_events), so the callback does no I/O
+callback_events = []
+# Reused float32 input for Whisper, large enough for a full batch (plus slack for resampler jitter)
+AUDIO_FLOAT_BUF = np.empty(WHISPER_TARGET_SR * (CHUNK_DURATION * MAX_BATCH_SIZE + 1), dtype=np.float32)
+INT16_SCALE = np.float32(1.0 / 32768.0)
 default_device_index = None 
+ACTUAL_SR = SAMPLERATE   # Negotiated in find_working_device()
+ACTUAL_CH = CHANNELS
+MONO_SOURCE = {"ch0": 0, "mean": "mean"}.get(MONO_MODE)  # Channel index or "mean"; None until calibrated
+UI_Q = queue.Queue()     # ("caption", text, latency) messages from the transcriber to the GUI thread
+TRANSCRIPT_FILE = "transcription.txt"
+TRANSCRIPT_FH = None     # Buffered handle kept open while saving; flushed on pause/stop, closed on exit
+
+
+# --- Model Loading ---
+def load_model_async():
+    """Imports the inference libraries and loads the model off the GUI thread, then warms it up.
+
+    Each candidate device is only accepted once its warm-up inference succeeds,
+    so a CUDA setup that fails at load or at first inference falls back to the CPU.
+    """
+    global model, batched_model, DEVICE, COMPUTE_TYPE, soxr, vad
+    try:
+        import ctranslate2
+        from faster_whisper import BatchedInferencePipeline, WhisperModel
+        import soxr
+        import webrtcvad
+        vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
+        has_cuda = ctranslate2.get_cuda_device_count() > 0
+    except Exception as e:
+        print(f"Fatal Error loading Whisper model: {e}", file=sys.stderr)
+        root.after(0, on_model_failed)
+        return
+
+    # Run on the GPU in FP16 when CTranslate2 sees a CUDA device; otherwise INT8 kernels on the CPU
+    # (same accuracy as FP32 for tiny.en, much faster)
+    candidates = []
+    if INFERENCE_DEVICE == "cuda" or (INFERENCE_DEVICE == "auto" and has_cuda):
+        candidates.append(("cuda", "float16"))
+    if INFERENCE_DEVICE in ("cpu", "auto"):
+        candidates.append(("cpu", "int8"))
+
+    for DEVICE, COMPUTE_TYPE in candidates:
+        try:
+            print(f"Loading model {MODEL_NAME} ({DEVICE}, {COMPUTE_TYPE}). It is downloaded on first run, this might take a moment...")
+            model = WhisperModel(MODEL_NAME, device=DEVICE, compute_type=COMPUTE_TYPE, cpu_threads=INFERENCE_THREADS)
+            batched_model = BatchedInferencePipeline(model=model)
+            print("Model loaded successfully.")
+            warm_up_model()
+        except Exception as e:
+            # e.g. an NVIDIA driver without the cuBLAS/cuDNN libraries CTranslate2 needs
+            print(f"Error loading Whisper model on {DEVICE.upper()}: {e}", file=sys.stderr)
+            model = batched_model = None
+            continue
+        model_ready.set()
+        root.after(0, on_model_ready)
+        return
+
+    DEVICE = COMPUTE_TYPE = None
+    print("Fatal Error loading Whisper model: no inference device worked.", file=sys.stderr)
+    root.after(0, on_model_failed)
+
+
+# --- Model Warm-up ---
+def warm_up_model():
+    """Runs dummy inferences so the first real chunks don't pay the one-time init/cache-warming cost.
+
+    Both transcription paths are exercised: a single chunk, then a batch as
+    large as the queue can get, so buffers for the largest encoder input are
+    already allocated when a backlog first has to be batched. Errors propagate:
+    a model that can't run a dummy chunk can't run real ones either.
+    """
+    start = time.time()
+    chunk_samples = WHISPER_TARGET_SR * CHUNK_DURATION
+    segments, _ = model.transcribe(np.zeros(chunk_samples, dtype=np.float32), **TRANSCRIBE_OPTIONS)
+    list(segments)  # Segments are decoded lazily; consume them to actually run the model
+    transcribe_batch(np.zeros(chunk_samples * MAX_BATCH_SIZE, dtype=np.float32), [chunk_samples] * MAX_BATCH_SIZE)
+    print(f"Model warmed up in {time.time() - start:.2f}s.")
 
 
 # --- Function to find the FIRST working device ---
 def find_working_device():
-    """Iterates through known input devices and returns the index of the first one that can open a stream."""
-    global default_device_index
+    """Iterates through known input devices and returns the index of the first one that accepts a capture format.
+
+    Each device is tried at 16 kHz mono first, falling back to 48 kHz stereo; the
+    format that worked is stored in ACTUAL_SR / ACTUAL_CH.
+    """
+    global default_device_index, ACTUAL_SR, ACTUAL_CH
     devices = sd.query_devices()
     device_map = {i: d['name'] for i, d in enumerate(devices) if d['max_input_channels'] > 0}
     
@@ -53,24 +198,34 @@ def find_working_device():
             device_name = device_map[index]
             print(f"   [TESTING] Trying Index {index}: {device_name[:30]}...")
             
-            try:
-                test_stream = sd.InputStream(
-                    samplerate=SAMPLERATE, 
-                    channels=CHANNELS, 
-                    dtype='int16', 
-                    device=index
-                )
-                test_stream.start()
-                test_stream.stop()
-                test_stream.close()
-                
-                default_device_index = index
-                print(f"   ✅ SUCCESS: Device Index {index} is usable with {SAMPLERATE} Hz!")
-                return index
-
-            except Exception as e:
-                print(f"   ❌ FAILED: Index {index} failed to open stream. Error: {e.args[0]}")
-                continue
+            for samplerate, channels in STREAM_FORMATS_TO_TRY:
+                try:
+                    # Validates the format with the host API without opening the device
+                    sd.check_input_settings(
+                        device=index, 
+                        samplerate=samplerate, 
+                        channels=channels, 
+                        dtype='int16'
+                    )
+                    if VERIFY_DEVICE_OPEN:
+                        test_stream = sd.InputStream(
+                            samplerate=samplerate, 
+                            channels=channels, 
+                            dtype='int16', 
+                            device=index
+                        )
+                        test_stream.start()
+                        test_stream.stop()
+                        test_stream.close()
+                    
+                    default_device_index = index
+                    ACTUAL_SR, ACTUAL_CH = samplerate, channels
+                    print(f"   ✅ SUCCESS: Device Index {index} is usable with {samplerate} Hz, {channels} channel(s)!")
+                    return index
+
+                except (sd.PortAudioError, ValueError) as e:
+                    print(f"   ❌ FAILED: Index {index} rejected {samplerate} Hz/{channels}ch. Error: {e.args[0]}")
+                    continue
     
     print("\n❌ FATAL: Could not find any working microphone input device.")
     return None
@@ -96,7 +251,221 @@ def check_audio_devices():
         print("RMS should now exceed the threshold (10) when speaking. Transcription and latency updates should proceed.")
 
 
+# --- Mono Conversion ---
+def calibrate_mono(audio):
+    """Decides once which channel to take, or whether to average, from channel energy and correlation."""
+    global MONO_SOURCE
+    energy = np.einsum('ij,ij->j', audio[:, :2], audio[:, :2], dtype=np.int64)
+    louder = int(np.argmax(energy))
+    if energy[1 - louder] < MONO_SILENT_CHANNEL_RATIO * energy[louder]:
+        # Averaging with a silent channel would only halve the voice level
+        MONO_SOURCE = louder
+        print(f"DEBUG: Channel {1 - louder} is (nearly) silent. Mono conversion: channel {louder}.")
+        return
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = np.corrcoef(audio[:, 0], audio[:, 1])[0, 1]
+    MONO_SOURCE = 0 if np.isfinite(correlation) and correlation > MONO_CORRELATION_THRESHOLD else "mean"
+    print(f"DEBUG: Channel correlation {correlation:.3f}. Mono conversion: {'average' if MONO_SOURCE == 'mean' else 'channel 0'}.")
+
+
+def to_mono(audio):
+    """Returns an int16 mono view/array of a captured chunk without going through float64."""
+    if ACTUAL_CH == 1:
+        return audio[:, 0]
+    if MONO_SOURCE in (0, 1):
+        return audio[:, MONO_SOURCE]
+    # Average in int32 and shift back down, so the result stays int16
+    return ((audio[:, 0].astype(np.int32) + audio[:, 1]) >> 1).astype(np.int16)
+
+
+# --- Voice Activity Detection ---
+def contains_speech(audio):
+    """Returns True as soon as webrtcvad flags VAD_MIN_SPEECH_MS of consecutive frames as speech."""
+    mono_audio = to_mono(audio)
+    if ACTUAL_SR != WHISPER_TARGET_SR:
+        # Needs the anti-aliasing filter too: hiss above 8 kHz folded into the speech band reads as speech
+        mono_audio = soxr.resample(mono_audio, ACTUAL_SR, WHISPER_TARGET_SR, quality=RESAMPLE_QUALITY)
+    frame_len = WHISPER_TARGET_SR * VAD_FRAME_MS // 1000
+    frames = mono_audio[:mono_audio.size - mono_audio.size % frame_len].reshape(-1, frame_len)
+    min_run = max(1, VAD_MIN_SPEECH_MS // VAD_FRAME_MS)
+    run = 0
+    for frame in frames:
+        run = run + 1 if vad.is_speech(frame.tobytes(), WHISPER_TARGET_SR) else 0
+        if run >= min_run:
+            return True
+    return False
+
+
+# --- Window Buffers ---
+def allocate_chunk_buffers():
+    """Prepares the recording tape and window slots for a new session and marks them all free.
+
+    The tape is only (re)allocated when the capture format changed.
+    """
+    global TAPE, tape_frames
+    tape_frames = int(ACTUAL_SR * TAPE_DURATION)
+    if TAPE.shape != (2 * tape_frames, ACTUAL_CH):
+        TAPE = np.empty((2 * tape_frames, ACTUAL_CH), dtype=np.int16)
+    with handoff:
+        buf_state[:] = [BUF_FREE] * RING_CHUNKS
+        buf_start_time[:] = [0.0] * RING_CHUNKS
+        buf_pos[:] = [0] * RING_CHUNKS
+        buf_frames[:] = [0] * RING_CHUNKS
+        buf_seq[:] = [0] * RING_CHUNKS
+        callback_events.clear()
+
+
+def window_audio(slot):
+    """Zero-copy view of a window's audio in the tape."""
+    start = buf_pos[slot] % tape_frames
+    return TAPE[start:start + buf_frames[slot]]
+
+
+def reserve_tape(end):
+    """Frees queued windows whose audio would be overwritten by recording up to absolute frame `end`.
+
+    Returns False, meaning nothing may be written, if such a window is still
+    being checked by the recording thread or copied out by the transcriber.
+    Called from the stream callback: drops are only recorded, not printed.
+    """
+    overwritten_before = end - tape_frames
+    with handoff:
+        stale = [i for i, state in enumerate(buf_state) if state != BUF_FREE and buf_pos[i] < overwritten_before]
+        if any(buf_state[i] != BUF_READY for i in stale):
+            return False
+        for i in stale:
+            buf_state[i] = BUF_FREE
+            callback_events.append(("overwritten", buf_start_time[i]))
+    return True
+
+
+def capture_window(pos, frames, start_time, seq):
+    """Describes a just-recorded window in a free slot and hands it to the recording thread's speech check.
+
+    Called from the stream callback, so it only updates the slot lists. Returns
+    False if every slot is in use (the window is skipped and the drop recorded).
+    """
+    with handoff:
+        if BUF_FREE not in buf_state:
+            callback_events.append(("no_slot", start_time))
+            return False
+        slot = buf_state.index(BUF_FREE)
+        buf_start_time[slot] = start_time
+        buf_pos[slot] = pos
+        buf_frames[slot] = frames
+        buf_seq[slot] = seq
+        buf_state[slot] = BUF_CAPTURED
+        handoff.notify_all()
+    return True
+
+
+def take_captured_windows(timeout):
+    """Waits up to `timeout` for captured windows and returns them, oldest first.
+
+    They stay BUF_CAPTURED (so the tape keeps them intact) until
+    enqueue_buffer() or release_buffer() is called on them.
+    """
+    with handoff:
+        handoff.wait_for(lambda: BUF_CAPTURED in buf_state, timeout)
+        return sorted((i for i, state in enumerate(buf_state) if state == BUF_CAPTURED), key=buf_seq.__getitem__)
+
+
+def record_callback_event(kind, value):
+    with handoff:
+        callback_events.append((kind, value))
+
+
+def report_callback_events():
+    """Prints the drops and stream status recorded by the callback since the last call (recording thread)."""
+    with handoff:
+        events = callback_events[:]
+        callback_events.clear()
+    now = time.time()
+    for kind, value in events:
+        if kind == "overwritten":
+            print(f"DROPPED: Transcription is behind, discarding the window recorded {now - value:.1f}s ago.")
+        elif kind == "no_slot":
+            print(f"DROPPED: All window slots are in use, skipping the window recorded {now - value:.1f}s ago.")
+        elif kind == "blocked":
+            print(f"DROPPED: {value} frames of audio, the tape still holds a window that is being read.")
+        elif kind == "status":
+            print(f"DEBUG: Input stream status: {value}", file=sys.stderr)
+
+
+def release_buffer(slot):
+    with handoff:
+        buf_state[slot] = BUF_FREE
+        handoff.notify_all()
+
+
+def ready_buffers():
+    """Indices of buffers waiting for transcription, oldest window first (call with `handoff` held)."""
+    return sorted((i for i, state in enumerate(buf_state) if state == BUF_READY), key=buf_seq.__getitem__)
+
+
+def enqueue_buffer(slot):
+    """Marks a checked window as ready for transcription.
+
+    If MAX_QUEUE_DEPTH chunks are already waiting, the oldest ones are dropped
+    first: for live captions a fresh chunk is worth more than a stale backlog.
+    """
+    with handoff:
+        waiting = ready_buffers()
+        dropped = waiting[:max(0, len(waiting) - MAX_QUEUE_DEPTH + 1)]
+        for i in dropped:
+            buf_state[i] = BUF_FREE
+        buf_state[slot] = BUF_READY
+        handoff.notify_all()
+    for i in dropped:
+        print(f"DROPPED: Transcription is behind, discarding the chunk recorded {time.time() - buf_start_time[i]:.1f}s ago.")
+
+
+def take_ready_buffers(timeout):
+    """Waits up to `timeout` for queued chunks and claims up to MAX_BATCH_SIZE of them, oldest first."""
+    with handoff:
+        handoff.wait_for(lambda: BUF_READY in buf_state, timeout)
+        slots = ready_buffers()[:MAX_BATCH_SIZE]
+        for i in slots:
+            buf_state[i] = BUF_BUSY
+    return slots
+
+
 # --- Recording Thread ---
+def publish_chunk(slot):
+    """Hands a captured window to the transcriber, or frees its slot right away if it is silent.
+
+    Runs on the recording thread, never in the stream callback. Returns True if
+    the window was handed over.
+    """
+    audio = window_audio(slot)
+    # --- VAD Proxy & DEBUGGING ---
+    frames = audio.shape[0]
+    # Per-channel sum of squares in a single int64-accumulated pass (no squared temporary, no
+    # int16 overflow). The louder channel is gated, so a mic on either input channel passes.
+    # Comparing it to threshold**2 * N is equivalent to RMS < threshold without the mean/sqrt.
+    energy = np.einsum('ij,ij->j', audio, audio, dtype=np.int64).max()
+    
+    rms = np.sqrt(energy / frames)
+    
+    # Near-digital silence is rejected by the cheap energy check; anything louder
+    # (including fan/HVAC noise) has to pass the VAD to be transcribed
+    if energy < VOLUME_THRESHOLD * VOLUME_THRESHOLD * frames:
+        release_buffer(slot)
+        print(f"DEBUG: Chunk recorded (Size: {audio.size}). RMS: {rms:.1f}. Detected SILENCE. Skipping transcription.")
+        return False
+    
+    if not contains_speech(audio):
+        release_buffer(slot)
+        print(f"DEBUG: Chunk recorded (Size: {audio.size}). RMS: {rms:.1f}. VAD found NO SPEECH. Skipping transcription.")
+        return False
+        
+    if ACTUAL_CH > 1 and MONO_SOURCE is None:
+        calibrate_mono(audio)
+    enqueue_buffer(slot)
+    print(f"DEBUG: Chunk recorded (Size: {audio.size}). RMS: {rms:.1f}. Detected VOICE! Queueing for transcription.")
+    return True
+
+
 def record_audio():
     global is_recording, is_paused
     
@@ -105,41 +474,89 @@ def record_audio():
         root.after(0, lambda: toggle_recording(force_stop=True))
         return
 
-    print(f"\nRecording started using SELECTED device {default_device_index} at {SAMPLERATE} Hz...")
+    print(f"\nRecording started using SELECTED device {default_device_index} at {ACTUAL_SR} Hz, {ACTUAL_CH} channel(s)...")
     
-    while is_recording:
+    # The callback writes every frame into the mirrored tape and, every STRIDE_DURATION
+    # seconds, captures the last CHUNK_DURATION seconds as a window (a view, no copy).
+    # The energy/VAD check runs here on the recording thread, outside the callback.
+    # Until a full window has been recorded (at start and after a pause) the windows are
+    # shorter, so the first words show up after one stride instead of a full window.
+    window_frames = int(ACTUAL_SR * CHUNK_DURATION)
+    stride_frames = int(ACTUAL_SR * STRIDE_DURATION)
+    total = 0                # Frames written to the tape this session
+    filled = 0               # Frames of the current window recorded so far
+    since_emit = 0           # Frames recorded since the last window was emitted
+    seq = 0
+
+    def emit_window():
+        nonlocal seq
+        capture_window(total - filled, filled, time.time() - filled / ACTUAL_SR, seq)
+        # Every window gets a number, so a skipped or missing one leaves a gap in the sequence
+        seq += 1
+
+    def callback(indata, frames, time_info, status):
+        nonlocal total, filled, since_emit, seq
+        if status:
+            record_callback_event("status", status)
         if is_paused:
-            time.sleep(0.1) 
-            continue
-        try:
-            start_time = time.time() 
-            
-            audio = sd.rec(
-                int(SAMPLERATE * CHUNK_DURATION), 
-                samplerate=SAMPLERATE, 
-                channels=CHANNELS, 
-                dtype='int16',
-                device=default_device_index 
-            )
-            
-            sd.wait() 
-            
-            # --- VAD Proxy & DEBUGGING ---
-            mono_audio = audio[:, 0] 
-            rms = np.sqrt(np.mean(mono_audio**2))
-            
-            # The RMS value is checked against the new, lower threshold
-            if rms < VOLUME_THRESHOLD:
-                print(f"DEBUG: Chunk recorded (Size: {audio.size}). RMS: {rms:.1f}. Detected SILENCE. Skipping transcription.")
-                
-            else:
-                audio_queue.put((SAMPLERATE, audio, start_time)) 
-                print(f"DEBUG: Chunk recorded (Size: {audio.size}). RMS: {rms:.1f}. Detected VOICE! Queueing for transcription.")
-
-        except Exception as e:
-            print(f"RUNTIME Recording error (Stream Closed): {e}", file=sys.stderr)
-            root.after(0, lambda: toggle_recording(force_stop=True))
-            break
+            # Windows after the pause must not straddle it: start over with an empty window
+            if filled:
+                filled = since_emit = 0
+                seq += 1
+            return
+
+        # Raw stream: view PortAudio's buffer as int16 frames without copying it
+        block = np.frombuffer(indata, dtype=np.int16).reshape(frames, ACTUAL_CH)
+        offset = 0
+        while offset < frames:
+            pos = total % tape_frames
+            n = min(frames - offset, tape_frames - pos, stride_frames - since_emit)
+            if not reserve_tape(total + n):
+                # The transcriber is still copying out audio that would be overwritten: drop this
+                # audio, and restart the window so it doesn't span the gap
+                record_callback_event("blocked", frames - offset)
+                filled = since_emit = 0
+                seq += 1
+                return
+            np.copyto(TAPE[pos:pos + n], block[offset:offset + n])
+            np.copyto(TAPE[pos + tape_frames:pos + tape_frames + n], block[offset:offset + n])
+            total += n
+            filled = min(filled + n, window_frames)
+            since_emit += n
+            offset += n
+
+            if since_emit == stride_frames:
+                since_emit = 0
+                emit_window()
+
+    try:
+        with sd.RawInputStream(
+            samplerate=ACTUAL_SR, 
+            channels=ACTUAL_CH, 
+            dtype='int16',
+            device=default_device_index, 
+            blocksize=STREAM_BLOCKSIZE, 
+            callback=callback
+        ) as stream:
+            while is_recording:
+                if not stream.active:
+                    raise RuntimeError("Input stream stopped unexpectedly.")
+                for slot in take_captured_windows(0.1):
+                    publish_chunk(slot)
+                report_callback_events()
+
+    except Exception as e:
+        print(f"RUNTIME Recording error (Stream Closed): {e}", file=sys.stderr)
+        root.after(0, lambda: toggle_recording(force_stop=True))
+    finally:
+        # The stream is closed: check what the callback captured last, so the transcriber can finish it
+        for slot in take_captured_windows(0):
+            try:
+                publish_chunk(slot)
+            except Exception as e:
+                release_buffer(slot)
+                print(f"RUNTIME Recording error (Stream Closed): {e}", file=sys.stderr)
+        report_callback_events()
         
     print("Recording thread gracefully stopped.")
 
@@ -153,66 +570,201 @@ def update_gui(text, latency):
 
     if save_transcript.get():
         try:
-            with open("transcription.txt", "a", encoding="utf-8") as f:
-                f.write(text + " ")
+            # Ticked mid-session: start saving from here on
+            if TRANSCRIPT_FH is None:
+                open_transcript()
+            TRANSCRIPT_FH.write(text + " ")
+        except Exception as e:
+             print(f"Error saving file: {e}", file=sys.stderr)
+
+
+def drain_ui_queue():
+    """Applies every queued UI message, then reschedules itself; runs on the GUI thread."""
+    try:
+        while True:
+            try:
+                kind, *args = UI_Q.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if kind == "caption":
+                    update_gui(*args)
+            except Exception as e:
+                # One failed update must not drop the rest of the queue
+                print(f"Error updating GUI: {e}", file=sys.stderr)
+    finally:
+        # Always reschedule, or no caption would be shown again for the rest of the run
+        root.after(UI_POLL_MS, drain_ui_queue)
+
+
+# --- Transcript File ---
+def open_transcript():
+    """Opens the session's transcript handle; writes are buffered and only hit the disk on flush."""
+    global TRANSCRIPT_FH
+    TRANSCRIPT_FH = open(TRANSCRIPT_FILE, "a", encoding="utf-8", buffering=65536)
+
+
+def flush_transcript():
+    if TRANSCRIPT_FH is not None:
+        try:
+            TRANSCRIPT_FH.flush()
         except Exception as e:
              print(f"Error saving file: {e}", file=sys.stderr)
 
 
+def close_transcript():
+    global TRANSCRIPT_FH
+    if TRANSCRIPT_FH is not None:
+        try:
+            TRANSCRIPT_FH.close()
+        except Exception as e:
+             print(f"Error saving file: {e}", file=sys.stderr)
+        TRANSCRIPT_FH = None
+
+
 # --- Transcription Thread ---
+def preprocess_chunk(audio, out):
+    """Converts a captured int16 chunk into the 16 kHz mono float32 signal Whisper expects.
+
+    The result is written into the front of `out` (scaling and casting in one pass)
+    and the filled view is returned.
+    """
+    audio_mono = to_mono(audio)
+    if ACTUAL_SR != WHISPER_TARGET_SR:
+        # Windows overlap, so each one is resampled on its own (no streaming state)
+        audio_mono = soxr.resample(audio_mono, ACTUAL_SR, WHISPER_TARGET_SR, quality=RESAMPLE_QUALITY)
+    audio_float = out[:audio_mono.size]
+    np.multiply(audio_mono, INT16_SCALE, out=audio_float, casting='unsafe')
+    return audio_float
+
+
+def transcribe_batch(audio, chunk_sizes):
+    """Transcribes several back-to-back chunks in one batched call and returns one text per chunk.
+
+    Each chunk of `audio` is passed as its own clip, so the encoder runs once
+    over the whole batch; segments are matched back to their chunk by their
+    start offset.
+    """
+    clip_timestamps = []
+    offset = 0.0
+    for size in chunk_sizes:
+        duration = size / WHISPER_TARGET_SR
+        clip_timestamps.append({"start": offset, "end": offset + duration})
+        offset += duration
+
+    segments, _ = batched_model.transcribe(
+        audio, 
+        clip_timestamps=clip_timestamps, 
+        batch_size=len(chunk_sizes), 
+        **TRANSCRIBE_OPTIONS
+    )
+
+    clip_starts = [clip["start"] for clip in clip_timestamps]
+    texts = [[] for _ in chunk_sizes]
+    for segment in segments:
+        chunk_index = bisect.bisect_right(clip_starts, segment.start + 1e-3) - 1
+        texts[max(chunk_index, 0)].append(segment.text.strip())
+    return [" ".join(parts).strip() for parts in texts]
+
+
 def transcribe_audio():
     global is_recording
     
-    while is_recording or not audio_queue.empty(): 
+    # Words of the last transcribed window, used to drop the part the next window repeats
+    last_words = []
+    last_seq = None
+    
+    while is_recording or BUF_CAPTURED in buf_state or BUF_READY in buf_state: 
         try:
-            # This is where transcription and latency calculation occurs
-            samplerate, audio, start_time = audio_queue.get(timeout=WHISPER_QUEUE_TIMEOUT) 
-            print(f"DEBUG: Starting transcription of chunk (Duration: {audio.size/samplerate:.2f}s)...")
+            # This is where transcription and latency calculation occurs.
+            # If transcription fell behind, the whole queue is taken along in the same call.
+            slots = take_ready_buffers(WHISPER_QUEUE_TIMEOUT)
+            if not slots:
+                if not is_recording:
+                    break 
+                continue
+            start_times = [buf_start_time[i] for i in slots]
+            seqs = [buf_seq[i] for i in slots]
+
+            print(f"DEBUG: Starting transcription of {len(slots)} chunk(s) (Duration: {sum(buf_frames[i] for i in slots)/ACTUAL_SR:.2f}s)...")
 
             # --- PRE-PROCESSING FOR WHISPER ---
-            audio_mono = audio.mean(axis=1)
-            num_samples = int(audio_mono.size * WHISPER_TARGET_SR / samplerate)
-            audio_resampled = resample(audio_mono, num_samples)
-            audio_float = audio_resampled.astype(np.float32).flatten() / 32768.0
+            # Chunks are written back to back into the shared float buffer
+            chunk_sizes = []
+            filled = 0
+            try:
+                for i in slots:
+                    size = preprocess_chunk(window_audio(i), AUDIO_FLOAT_BUF[filled:]).size
+                    chunk_sizes.append(size)
+                    filled += size
+            finally:
+                # The windows are copied out now, so the tape may overwrite them
+                for i in slots:
+                    release_buffer(i)
             
             # Transcribe
-            result = model.transcribe(audio_float, fp16=False, language="en")
-            text = result["text"].strip()
+            audio_float = AUDIO_FLOAT_BUF[:filled]
+            if len(chunk_sizes) == 1:
+                segments, _ = model.transcribe(audio_float, **TRANSCRIBE_OPTIONS)
+                texts = [" ".join(segment.text.strip() for segment in segments).strip()]
+            else:
+                texts = transcribe_batch(audio_float, chunk_sizes)
             
             end_time = time.time() 
-            latency = end_time - start_time 
 
-            if text:
-                print(f"DEBUG: Transcription successful. Text: '{text}'. Latency: {latency:.2f}s")
-                root.after(0, lambda t=text, l=latency: update_gui(t, l))
-            else:
-                 print(f"DEBUG: Transcription returned empty text (Likely silence or very low confidence). Latency: {latency:.2f}s")
+            for start_time, seq, text in zip(start_times, seqs, texts):
+                latency = end_time - start_time 
+
+                # A window right after the previous one repeats its last seconds; only show the new words
+                if last_seq is not None and seq == last_seq + 1:
+                    new_text = strip_overlap(last_words, text)
+                else:
+                    new_text = text
+                last_words, last_seq = normalize_words(text), seq
+
+                if new_text:
+                    print(f"DEBUG: Transcription successful. Text: '{new_text}'. Latency: {latency:.2f}s")
+                    UI_Q.put(("caption", new_text, latency))
+                elif text:
+                    print(f"DEBUG: Window only repeated the previous one. Latency: {latency:.2f}s")
+                else:
+                     print(f"DEBUG: Transcription returned empty text (Likely silence or very low confidence). Latency: {latency:.2f}s")
         
-        except queue.Empty:
-            if not is_recording:
-                break 
-            continue
         except Exception as e:
             print(f"Transcription runtime error: {e}", file=sys.stderr)
             
     print("Transcription thread gracefully stopped.")
 
 
-# --- Button Functions (No change) ---
+# --- Button Functions ---
+def on_model_ready():
+    if default_device_index is not None:
+        record_btn.config(state=tk.NORMAL, text="🎙 Start")
+
+def on_model_failed():
+    record_btn.config(state=tk.DISABLED, text="❌ No Model")
+
 def toggle_recording(force_stop=False):
     global is_recording, is_paused
     if not is_recording or force_stop:
         if default_device_index is None:
              print("Cannot start: No working microphone found. Please check system settings.", file=sys.stderr)
              return
+        if not model_ready.is_set():
+             print("Cannot start: Model is still warming up.", file=sys.stderr)
+             return
         
         is_recording = True
         is_paused = False
         record_btn.config(text="⏹ Stop", bg="#e74c3c")
         pause_btn.config(text="⏸ Pause", bg="#f1c40f", state=tk.NORMAL)
         latency_label.config(text="Latency: 0.00s") 
-        with audio_queue.mutex:
-             audio_queue.queue.clear()
+        allocate_chunk_buffers()
+        if save_transcript.get() and TRANSCRIPT_FH is None:
+            try:
+                open_transcript()
+            except Exception as e:
+                 print(f"Error saving file: {e}", file=sys.stderr)
         
         threading.Thread(target=record_audio, daemon=True).start()
         threading.Thread(target=transcribe_audio, daemon=True).start()
@@ -221,6 +773,8 @@ def toggle_recording(force_stop=False):
         is_recording = False
         record_btn.config(text="🎙 Start", bg="#40CE79")
         pause_btn.config(text="⏸ Pause", state=tk.DISABLED) 
+        # Windows still queued are transcribed after this; they are flushed on the next pause/stop or on exit
+        flush_transcript()
 
 def toggle_pause():
     global is_paused
@@ -231,16 +785,25 @@ def toggle_pause():
         else:
             is_paused = True
             pause_btn.config(text="▶ Resume", bg="#9b59b6")
+            flush_transcript()
 
 def clear_text():
     caption_box.delete(1.0, tk.END)
     latency_label.config(text="Latency: 0.00s") 
 
-# --- GUI Setup (No change) ---
+def on_close():
+    global is_recording
+    is_recording = False
+    close_transcript()
+    root.destroy()
+
+# --- GUI Setup ---
 root = tk.Tk()
 root.title("🎧 Real-Time Voice-to-Text Transcriber (Whisper)")
 root.geometry("800x550") 
 root.config(bg="#1e1e1e")
+root.protocol("WM_DELETE_WINDOW", on_close)
+root.after(UI_POLL_MS, drain_ui_queue)
 
 check_audio_devices() 
 
@@ -277,6 +840,8 @@ record_btn.grid(row=0, column=0, padx=10)
 
 if default_device_index is None:
     record_btn.config(state=tk.DISABLED, text="❌ No Mic")
+elif not model_ready.is_set():
+    record_btn.config(state=tk.DISABLED, text="⏳ Loading")
     
 pause_btn = tk.Button(frame, text="⏸ Pause", font=("Arial", 12, "bold"), bg="#f1c40f", fg="white", width=10, command=toggle_pause)
 pause_btn.grid(row=0, column=1, padx=10)
@@ -297,4 +862,6 @@ save_check = tk.Checkbutton(
 )
 save_check.pack(pady=5)
 
+# Load and warm up the model in the background; the record button stays on "Loading" until then
+threading.Thread(target=load_model_async, daemon=True).start()
 root.mainloop()
\ No newline at end of file
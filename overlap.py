@@ -0,0 +1,50 @@
+"""Removing the words an overlapping window repeats from the previous one."""
+import string
+
+OVERLAP_MIN_WORDS = 2       # Fewer matching words than this is treated as a coincidence, not an overlap
+OVERLAP_MAX_MISMATCH = 2    # Unmatched words tolerated on each side (a window often ends or starts mid-word)
+OVERLAP_SEARCH_WORDS = 15   # Words compared at the end of the previous / start of the new window
+
+
+def normalize_words(text):
+    return [word.strip(string.punctuation).lower() for word in text.split()]
+
+
+def _lcs_lengths(words, head):
+    """Returns, for every j, the length of the longest common subsequence of `words` and head[:j]."""
+    row = [0] * (len(head) + 1)
+    for word in words:
+        previous = row
+        row = [0]
+        for j, other in enumerate(head):
+            row.append(previous[j] + 1 if word == other else max(previous[j + 1], row[j]))
+    return row
+
+
+def strip_overlap(previous_words, text):
+    """Removes the words at the start of `text` that the previous (overlapping) window already produced.
+
+    The previous window's last words and the new window's first words are aligned
+    word by word (longest common subsequence, case- and punctuation-insensitive).
+    The overlap must reach the end of the previous window and the start of the new
+    one, up to OVERLAP_MAX_MISMATCH words on each side that did not match (a cut-off
+    or misheard boundary word), and contain at least OVERLAP_MIN_WORDS matches.
+    """
+    words = text.split()
+    tail = previous_words[-OVERLAP_SEARCH_WORDS:]
+    head = normalize_words(text)[:OVERLAP_SEARCH_WORDS]
+
+    best = None  # (matches, -end): most matched words, then the shortest stripped prefix
+    for i in range(len(tail)):
+        lengths = _lcs_lengths(tail[i:], head)
+        for j in range(1, len(head) + 1):
+            matches = lengths[j]
+            if matches < OVERLAP_MIN_WORDS:
+                continue
+            if len(tail) - i - matches > OVERLAP_MAX_MISMATCH or j - matches > OVERLAP_MAX_MISMATCH:
+                continue
+            if best is None or (matches, -j) > best:
+                best = (matches, -j)
+    if best is None:
+        return text
+    return " ".join(words[-best[1]:])
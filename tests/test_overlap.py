@@ -0,0 +1,35 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from overlap import normalize_words, strip_overlap
+
+
+class StripOverlapTest(unittest.TestCase):
+    def test_strips_overlap_when_previous_window_ends_mid_word(self):
+        previous = normalize_words("so I drove over to the sto")
+        self.assertEqual(
+            strip_overlap(previous, "over to the store and bought some milk"),
+            "store and bought some milk",
+        )
+
+    def test_keeps_text_when_only_one_word_matches(self):
+        previous = normalize_words("the cat sat on the")
+        self.assertEqual(strip_overlap(previous, "the mat was red"), "the mat was red")
+
+    def test_tolerates_misheard_first_word(self):
+        previous = normalize_words("we went to the park")
+        self.assertEqual(strip_overlap(previous, "uh to the park and then home"), "and then home")
+
+    def test_ignores_case_and_punctuation(self):
+        previous = normalize_words("hello there my friend")
+        self.assertEqual(strip_overlap(previous, "There, my friend. How are you?"), "How are you?")
+
+    def test_keeps_text_without_previous_window(self):
+        self.assertEqual(strip_overlap([], "a new sentence"), "a new sentence")
+
+
+if __name__ == "__main__":
+    unittest.main()